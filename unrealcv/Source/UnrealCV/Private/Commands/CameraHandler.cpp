@@ -160,6 +160,8 @@ FExecStatus FCameraHandler::SetCameraRotation(const TArray<FString>& Args)
 EFilenameType FCameraHandler::ParseFilenameType(const FString& Filename)
 {
 	bool bIncludeDot = false;
+	if (Filename.StartsWith(TEXT("shm:"))) return EFilenameType::SharedMemory;
+
 	FString FileExtension = FPaths::GetExtension(Filename);
 	FileExtension.ToLowerInline();
 
@@ -183,6 +185,43 @@ EFilenameType FCameraHandler::ParseFilenameType(const FString& Filename)
 	return EFilenameType::Invalid;
 }
 
+/**
+ * Write BGR pixels into a shared memory region created by the client, so that a local client
+ * does not need to receive the image through the socket. Spec is [name]:[size in bytes].
+ * The region is mapped for each frame, so the client is free to recreate it.
+ */
+static FExecStatus WriteSharedMemory(const TArray<FColor>& Data, int Width, int Height, const FString& Spec)
+{
+	FString Name, SizeStr;
+	if (!Spec.Split(TEXT(":"), &Name, &SizeStr, ESearchCase::CaseSensitive, ESearchDir::FromEnd))
+	{
+		return FExecStatus::Error(FString::Printf(TEXT("Invalid shared memory %s, expect shm:[name]:[size]"), *Spec));
+	}
+	SIZE_T Size = (SIZE_T)Width * Height * 3;
+	if ((SIZE_T)FCString::Atoi64(*SizeStr) < Size)
+	{
+		return FExecStatus::Error(FString::Printf(TEXT("Shared memory %s is too small for %dx%d image"), *Name, Width, Height));
+	}
+
+	uint32 AccessMode = (uint32)FPlatformMemory::ESharedMemoryAccess::Read | (uint32)FPlatformMemory::ESharedMemoryAccess::Write;
+	FPlatformMemory::FSharedMemoryRegion* Region = FPlatformMemory::MapNamedSharedMemoryRegion(Name, false, AccessMode, Size);
+	if (!Region)
+	{
+		return FExecStatus::Error(FString::Printf(TEXT("Can not open shared memory %s"), *Name));
+	}
+
+	uint8* Dst = (uint8*)Region->GetAddress();
+	for (const FColor& Color : Data)
+	{
+		*Dst++ = Color.B;
+		*Dst++ = Color.G;
+		*Dst++ = Color.R;
+	}
+	FPlatformMemory::UnmapNamedSharedMemoryRegion(Region);
+
+	return FExecStatus::OK(FString::Printf(TEXT("%d %d"), Width, Height));
+}
+
 /** Serialize data according to filename format */
 FExecStatus FCameraHandler::SerializeData(const TArray<FColor>& Data, int Width, int Height, const FString& Filename)
 {
@@ -204,6 +243,8 @@ FExecStatus FCameraHandler::SerializeData(const TArray<FColor>& Data, int Width,
 	case EFilenameType::Png:
 		ImageUtil.SavePngFile(Data, Width, Height, Filename);
 		return FExecStatus::OK(Filename);
+	case EFilenameType::SharedMemory:
+		return WriteSharedMemory(Data, Width, Height, Filename.RightChop(4));
 	}
 	return FExecStatus::Error(FString::Printf(TEXT("Invalid filename type, filename %s"), *Filename));
 }
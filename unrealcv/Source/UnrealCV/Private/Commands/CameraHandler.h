@@ -11,6 +11,7 @@ enum EFilenameType
 	PngBinary,
 	NpyBinary,
 	BmpBinary,
+	SharedMemory, // shm:[name]:[size], a shared memory region created by the client
 	Invalid, // Unrecognized filename type
 };
 
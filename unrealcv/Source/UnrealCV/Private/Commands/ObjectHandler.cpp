@@ -50,6 +50,12 @@ void FObjectHandler::RegisterCommands()
 		"Get the name of all objects"
 	);
 
+	CommandDispatcher->BindCommand(
+		"vget /objects/poses [str]",
+		FDispatcherDelegate::CreateRaw(this, &FObjectHandler::GetPoses),
+		"Get [x, y, z, pitch, yaw, roll] of comma separated objects, encoded as msgpack binary"
+	);
+
 	CommandDispatcher->BindCommand(
 		"vset /objects/spawn_cube",
 		FDispatcherDelegate::CreateRaw(this, &FObjectHandler::SpawnBox),
@@ -236,6 +242,63 @@ FExecStatus FObjectHandler::GetObjectList(const TArray<FString>& Args)
 	return FExecStatus::OK(StrActorList);
 }
 
+/** Append a msgpack array header for an array with Num elements */
+static void WriteMsgpackArrayHeader(TArray<uint8>& Out, uint32 Num)
+{
+	if (Num < 16)
+	{
+		Out.Add((uint8)(0x90 | Num));
+	}
+	else if (Num < 65536)
+	{
+		Out.Add(0xdc);
+		Out.Add((uint8)(Num >> 8));
+		Out.Add((uint8)Num);
+	}
+	else
+	{
+		Out.Add(0xdd);
+		for (int Shift = 24; Shift >= 0; Shift -= 8) Out.Add((uint8)(Num >> Shift));
+	}
+}
+
+/** Append a msgpack float 64, which is stored in big-endian. Float 32 would lose precision on large world coordinates */
+static void WriteMsgpackDouble(TArray<uint8>& Out, double Value)
+{
+	uint64 Bits;
+	FMemory::Memcpy(&Bits, &Value, sizeof(Bits));
+	Out.Add(0xcb);
+	for (int Shift = 56; Shift >= 0; Shift -= 8) Out.Add((uint8)(Bits >> Shift));
+}
+
+/** Return the poses of several objects in one reply, so the client does not pay a round trip per object */
+FExecStatus FObjectHandler::GetPoses(const TArray<FString>& Args)
+{
+	TArray<FString> ActorIds;
+	Args[0].ParseIntoArray(ActorIds, TEXT(","), true);
+
+	TArray<uint8> BinaryData;
+	BinaryData.Reserve(5 + ActorIds.Num() * (1 + 6 * 9));
+	WriteMsgpackArrayHeader(BinaryData, ActorIds.Num());
+	for (const FString& ActorId : ActorIds)
+	{
+		AActor* Actor = GetActorById(FUnrealcvServer::Get().GetWorld(), ActorId);
+		if (!Actor) return FExecStatus::Error(FString::Printf(TEXT("Can not find object %s"), *ActorId));
+
+		FActorController Controller(Actor);
+		FVector Location = Controller.GetLocation();
+		FRotator Rotation = Controller.GetRotation();
+		const double Pose[6] = {
+			Location.X, Location.Y, Location.Z,
+			Rotation.Pitch, Rotation.Yaw, Rotation.Roll
+		};
+
+		WriteMsgpackArrayHeader(BinaryData, 6);
+		for (double Value : Pose) WriteMsgpackDouble(BinaryData, Value);
+	}
+	return FExecStatus::Binary(BinaryData);
+}
+
 FExecStatus FObjectHandler::GetLocation(const TArray<FString>& Args)
 {
 	AActor* Actor = GetActor(Args);
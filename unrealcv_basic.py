@@ -4,16 +4,89 @@ This module provides a client interface for communicating with Unreal Engine,
 allowing for various operations such as object spawning, movement, and image
 capture.
 """
-import json
+import struct
 import time
-from io import BytesIO
-from threading import Lock
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from threading import Event, Lock, Thread, current_thread, local
 
 import cv2
+import msgspec
 import numpy as np
-import PIL.Image
 import unrealcv
 
+_BMP_HEADER_SIZE = 54  # BITMAPFILEHEADER + BITMAPINFOHEADER, followed by an int32 count and the pixels
+_DIR_FLIP = (1, 0, 3, 2)  # Opposite of each move direction, used for negative speed
+
+
+def _parse_floats(responses, shape):
+    """Parse the space separated numbers of UnrealCV replies into one float array.
+
+    All replies are joined and parsed by a single np.fromstring call, which runs in C.
+
+    Args:
+        responses: Reply string, or list of reply strings.
+        shape: Shape of the result.
+
+    Returns:
+        Float array of the given shape.
+    """
+    text = responses if isinstance(responses, str) else ' '.join(responses)
+    values = np.fromstring(text, sep=' ')
+    if values.size != np.prod(shape):
+        # np.fromstring only warns when it stops at a token that is not a number, e.g. an error message
+        raise ValueError(f'Can not parse {shape} floats from reply {text[:200]!r}')
+    return values.reshape(shape)
+
+
+def _bmp_size(res):
+    """Read the image size from the header of a BMP reply.
+
+    Args:
+        res: Reply of a bmp image request.
+
+    Returns:
+        Tuple (width, height), None if res is not a BMP image, e.g. an error message.
+    """
+    if not isinstance(res, bytes) or len(res) < _BMP_HEADER_SIZE or res[:2] != b'BM':
+        return None
+    # biWidth and biHeight of BITMAPINFOHEADER, UE stores the height negative (top-down rows)
+    [w, h] = struct.unpack_from('<ii', res, 18)
+    return w, abs(h)
+
+
+class CollisionResponse(msgspec.Struct):
+    """Reply of the GetCollisionNum blueprint function."""
+
+    TotalCollision: int
+
+
+class ActionHandle(object):
+    """Handle of an action running in Unreal Engine, returned by apply_action_*.
+
+    The action command has already been sent, so the caller can fetch observations
+    while it runs and call wait() when it needs the action to be finished.
+    """
+
+    def __init__(self, duration):
+        """Start timing an action.
+
+        Args:
+            duration: Duration of the action in seconds.
+        """
+        self.deadline = time.perf_counter() + duration
+
+    def done(self):
+        """Whether the duration of the action has elapsed."""
+        return time.perf_counter() >= self.deadline
+
+    def wait(self):
+        """Block until the duration of the action has elapsed."""
+        remaining = self.deadline - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+
 
 class UnrealCV(object):
     """Interface class for communication with Unreal Engine.
@@ -31,6 +104,7 @@ class UnrealCV(object):
             resolution: Resolution, defaults to (320, 240).
         """
         self.ip = ip
+        self.port = port
         # Build a client to connect to the environment
         self.client = unrealcv.Client((ip, port))
         self.client.connect()
@@ -38,14 +112,41 @@ class UnrealCV(object):
         self.resolution = resolution
         self.ini_unrealcv(resolution)
 
+        # unrealcv.Client pairs replies with requests by order and has no lock of its own,
+        # so every request must hold this lock. Keep only the round trip inside it.
         self.lock = Lock()
+        # Deferred commands are queued per thread and sent in batches by a background flusher
+        self._tls = local()
+        self._queues = []  # (thread, queue) of all threads that have deferred commands
+        self._queues_lock = Lock()
+        self._flush_lock = Lock()
+        self._flush_event = Event()
+        self._closed = False
+        self._flusher = Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+        self._snapshot_supported = True  # Set to False once the WorldManager blueprint is found missing
+        self._pose_decoder = msgspec.msgpack.Decoder(list[list[float]])
+        # Blueprint outputs are serialized as strings, strict=False lets msgspec convert them to int
+        self._collision_decoder = msgspec.json.Decoder(CollisionResponse, strict=False)
+        self._shm = {}  # cam_id -> SharedMemory the images of mode='shm' are written to
+        # (cam_id, viewmode) UE could not write to shared memory, e.g. depth, read with 'fast'
+        self._shm_unsupported = set()
+        self._pool = ThreadPoolExecutor()  # Decodes the images of read_images in parallel
 
     ###################################################
     # Basic Operations
     ###################################################
     def disconnect(self):
-        """Disconnect from Unreal Engine."""
+        """Disconnect from Unreal Engine, after sending the deferred commands left."""
+        with self._queues_lock:
+            self._closed = True
+        self._flush_event.set()
+        self._flusher.join()
+        self.flush()
+        self._pool.shutdown()
         self.client.disconnect()
+        for cam_id in list(self._shm):
+            self._release_shm(cam_id)
 
     def ini_unrealcv(self, resolution=(320, 240)):
         """Initialize UnrealCV settings.
@@ -55,13 +156,15 @@ class UnrealCV(object):
         """
         self.check_connection()
         [w, h] = resolution
-        self.client.request(f'vrun setres {w}x{h}w', -1)  # Set resolution of display window
-        self.client.request('DisableAllScreenMessages', -1)  # Disable all screen messages
-        self.client.request('vrun sg.ShadowQuality 0', -1)  # Set shadow quality to low
-        self.client.request('vrun sg.TextureQuality 0', -1)  # Set texture quality to low
-        self.client.request('vrun sg.EffectsQuality 0', -1)  # Set effects quality to low
-
-        self.client.request('vrun Editor.AsyncSkinnedAssetCompilation 2', -1)  # To correctly load the character
+        cmds = [
+            f'vrun setres {w}x{h}w',  # Set resolution of display window
+            'DisableAllScreenMessages',  # Disable all screen messages
+            'vrun sg.ShadowQuality 0',  # Set shadow quality to low
+            'vrun sg.TextureQuality 0',  # Set texture quality to low
+            'vrun sg.EffectsQuality 0',  # Set effects quality to low
+            'vrun Editor.AsyncSkinnedAssetCompilation 2',  # To correctly load the character
+        ]
+        self.client.request(cmds, -1)  # Send as one batch without waiting for replies
         time.sleep(0.1)
 
     def check_connection(self):
@@ -80,8 +183,7 @@ class UnrealCV(object):
             name: Object name.
         """
         cmd = f'vset /objects/spawn {prefab} {name}'
-        with self.lock:
-            self.client.request(cmd)
+        self._request(cmd)
 
     def spawn_bp_asset(self, prefab_path, name):
         """Spawn a blueprint asset.
@@ -91,49 +193,146 @@ class UnrealCV(object):
             name: Object name.
         """
         cmd = f'vset /objects/spawn_bp_asset {prefab_path} {name}'
-        with self.lock:
-            self.client.request(cmd)
+        self._request(cmd)
 
     def clean_garbage(self):
         """Clean garbage objects."""
-        with self.lock:
-            self.client.request('vset /action/clean_garbage')
+        self._request('vset /action/clean_garbage')
 
-    def set_location(self, loc, name):
+    def set_location(self, loc, name, defer=False):
         """Set object location.
 
         Args:
             loc: Location coordinates in the form [x, y, z].
             name: Object name.
+            defer: Whether to queue the command and return at once, defaults to False.
+
+        Returns:
+            A Future resolved with the reply when defer is True, otherwise None.
         """
         [x, y, z] = loc
         cmd = f'vset /object/{name}/location {x} {y} {z}'
-        with self.lock:
-            self.client.request(cmd)
+        if defer:
+            return self._enqueue(cmd)
+        self._request(cmd)
 
-    def set_orientation(self, orientation, name):
+    def set_orientation(self, orientation, name, defer=False):
         """Set object orientation.
 
         Args:
             orientation: Orientation in the form [pitch, yaw, roll].
             name: Object name.
+            defer: Whether to queue the command and return at once, defaults to False.
+
+        Returns:
+            A Future resolved with the reply when defer is True, otherwise None.
         """
         [pitch, yaw, roll] = orientation
         cmd = f'vset /object/{name}/rotation {pitch} {yaw} {roll}'
-        with self.lock:
-            self.client.request(cmd)
+        if defer:
+            return self._enqueue(cmd)
+        self._request(cmd)
 
-    def set_scale(self, scale, name):
+    def set_scale(self, scale, name, defer=False):
         """Set object scale.
 
         Args:
             scale: Scale in the form [x, y, z].
             name: Object name.
+            defer: Whether to queue the command and return at once, defaults to False.
+
+        Returns:
+            A Future resolved with the reply when defer is True, otherwise None.
         """
         [x, y, z] = scale
         cmd = f'vset /object/{name}/scale {x} {y} {z}'
+        if defer:
+            return self._enqueue(cmd)
+        self._request(cmd)
+
+    def flush(self):
+        """Send all deferred commands queued so far in one batch.
+
+        The background flusher calls this as soon as commands are queued, so
+        commands queued while a batch is in flight go out together in the next one.
+        Every blocking command calls it first, so it never overtakes a command
+        queued before it and getters observe every queued update.
+        """
+        # Skip the locks when nothing is queued, e.g. if commands are never deferred.
+        # A command popped by a running flush is in flight until _flush_lock is released.
+        if not any(queue for _, queue in self._queues) and not self._flush_lock.locked():
+            return
+        with self._flush_lock:
+            with self._queues_lock:
+                queues = list(self._queues)
+            batch = []
+            for _, queue in queues:
+                while queue:
+                    batch.append(queue.popleft())
+            with self._queues_lock:
+                # Threads that have exited can not queue more commands, forget their drained queues
+                self._queues = [(t, q) for t, q in self._queues if q or t.is_alive()]
+            if not batch:
+                return
+            try:
+                with self.lock:
+                    res = self.client.request_batch([cmd for cmd, _ in batch])
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                raise
+            for (_, future), r in zip(batch, res):
+                future.set_result(r)
+
+    def _enqueue(self, cmd):
+        """Queue a command on the calling thread's queue and wake the flusher.
+
+        Args:
+            cmd: Command string.
+
+        Returns:
+            A Future resolved with the reply of the command.
+        """
+        queue = getattr(self._tls, 'queue', None)
+        future = Future()
+        with self._queues_lock:
+            # Checked under the lock, so disconnect() sends every command queued before it
+            if self._closed:
+                raise RuntimeError('Can not defer a command after disconnect')
+            if queue is None:
+                queue = self._tls.queue = deque()
+                self._queues.append((current_thread(), queue))
+            queue.append((cmd, future))
+        self._flush_event.set()
+        return future
+
+    def _flush_loop(self):
+        """Send queued commands in the background until disconnect."""
+        while not self._closed:
+            self._flush_event.wait()
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # The futures of the batch already carry the exception, keep flushing
+
+    def _request(self, cmd):
+        """Send a blocking command after the deferred commands queued so far.
+
+        The deferred commands of all threads are flushed first, so if their batch fails,
+        the exception is raised here, even if the failed commands came from another thread.
+
+        Args:
+            cmd: Command string, or list of commands sent as one batch.
+
+        Returns:
+            Reply of the command, list of replies for a list of commands.
+        """
+        self.flush()
         with self.lock:
-            self.client.request(cmd)
+            if isinstance(cmd, list):
+                return self.client.request_batch(cmd)
+            return self.client.request(cmd)
 
     def enable_controller(self, name, enable_controller):
         """Enable or disable controller.
@@ -143,8 +342,7 @@ class UnrealCV(object):
             enable_controller: Whether to enable controller.
         """
         cmd = f'vbp {name} EnableController {enable_controller}'
-        with self.lock:
-            self.client.request(cmd)
+        self._request(cmd)
 
     def set_physics(self, actor_name, hasPhysics):
         """Set physics properties.
@@ -154,8 +352,7 @@ class UnrealCV(object):
             hasPhysics: Whether to enable physics.
         """
         cmd = f'vset /object/{actor_name}/physics {hasPhysics}'
-        with self.lock:
-            self.client.request(cmd)
+        self._request(cmd)
 
     def set_collision(self, actor_name, hasCollision):
         """Set collision properties.
@@ -165,8 +362,7 @@ class UnrealCV(object):
             hasCollision: Whether to enable collision.
         """
         cmd = f'vset /object/{actor_name}/collision {hasCollision}'
-        with self.lock:
-            self.client.request(cmd)
+        self._request(cmd)
 
     def set_movable(self, actor_name, isMovable):
         """Set movable properties.
@@ -176,8 +372,7 @@ class UnrealCV(object):
             isMovable: Whether the object is movable.
         """
         cmd = f'vset /object/{actor_name}/object_mobility {isMovable}'
-        with self.lock:
-            self.client.request(cmd)
+        self._request(cmd)
 
     def destroy(self, actor_name):
         """Destroy an object.
@@ -186,8 +381,7 @@ class UnrealCV(object):
             actor_name: Actor name.
         """
         cmd = f'vset /object/{actor_name}/destroy'
-        with self.lock:
-            self.client.request(cmd)
+        self._request(cmd)
 
     def apply_action_transition(self, robot_name, action):
         """Apply transition action.
@@ -195,22 +389,19 @@ class UnrealCV(object):
         Args:
             robot_name: Robot name.
             action: Action in the form [speed, duration, direction].
+
+        Returns:
+            ActionHandle to wait for the end of the action.
         """
         [speed, duration, direction] = action
+        if direction not in range(len(_DIR_FLIP)):
+            raise ValueError(f'Invalid move direction {direction!r}, expected 0 to {len(_DIR_FLIP) - 1}')
         if speed < 0:
             # Switch direction
-            if direction == 0:
-                direction = 1
-            elif direction == 1:
-                direction = 0
-            elif direction == 2:
-                direction = 3
-            elif direction == 3:
-                direction = 2
+            direction = _DIR_FLIP[int(direction)]
         cmd = f'vbp {robot_name} Move_Speed {speed} {duration} {direction}'
-        with self.lock:
-            self.client.request(cmd)
-        time.sleep(duration)
+        self._request(cmd)
+        return ActionHandle(duration)
 
     def apply_action_rotation(self, robot_name, action):
         """Apply rotation action.
@@ -218,12 +409,14 @@ class UnrealCV(object):
         Args:
             robot_name: Robot name.
             action: Action in the form [duration, angle, direction].
+
+        Returns:
+            ActionHandle to wait for the end of the action.
         """
         [duration, angle, direction] = action
         cmd = f'vbp {robot_name} Rotate_Angle {duration} {angle} {direction}'
-        with self.lock:
-            self.client.request(cmd)
-        time.sleep(duration)
+        self._request(cmd)
+        return ActionHandle(duration)
 
     def get_objects(self):
         """Get all objects.
@@ -231,10 +424,8 @@ class UnrealCV(object):
         Returns:
             List of objects.
         """
-        with self.lock:
-            res = self.client.request('vget /objects')
-        objects = np.array(res.split())
-        return objects
+        res = self._request('vget /objects')
+        return res.split()
 
     def get_total_collision(self, name):
         """Get total collision count.
@@ -245,9 +436,8 @@ class UnrealCV(object):
         Returns:
             Total collision count.
         """
-        with self.lock:
-            res = self.client.request(f'vbp {name} GetCollisionNum')
-        total_collision = eval(json.loads(res)['TotalCollision'])
+        res = self._request(f'vbp {name} GetCollisionNum')
+        total_collision = self._collision_decoder.decode(res).TotalCollision
         return total_collision
 
     def get_location(self, actor_name):
@@ -260,10 +450,8 @@ class UnrealCV(object):
             Location coordinates array.
         """
         cmd = f'vget /object/{actor_name}/location'
-        with self.lock:
-            res = self.client.request(cmd)
-        location = [float(i) for i in res.split()]
-        return np.array(location)
+        res = self._request(cmd)
+        return _parse_floats(res, (3,))
 
     def get_location_batch(self, actor_names):
         """Batch get object locations.
@@ -272,14 +460,12 @@ class UnrealCV(object):
             actor_names: List of actor names.
 
         Returns:
-            List of location coordinate arrays.
+            Array of shape (N, 3), one location per row.
         """
         cmd = [f'vget /object/{actor_name}/location' for actor_name in actor_names]
-        with self.lock:
-            res = self.client.request_batch(cmd)
-        # Parse each response and convert to numpy array
-        locations = [np.array([float(i) for i in r.split()]) for r in res]
-        return locations
+        res = self._request(cmd)
+        # Parse all responses at once into a single contiguous array
+        return _parse_floats(res, (len(res), 3))
 
     def get_orientation(self, actor_name):
         """Get object orientation.
@@ -291,10 +477,8 @@ class UnrealCV(object):
             Orientation array.
         """
         cmd = f'vget /object/{actor_name}/rotation'
-        with self.lock:
-            res = self.client.request(cmd)
-            orientation = [float(i) for i in res.split()]
-        return np.array(orientation)
+        res = self._request(cmd)
+        return _parse_floats(res, (3,))
 
     def get_orientation_batch(self, actor_names):
         """Batch get object orientations.
@@ -303,14 +487,79 @@ class UnrealCV(object):
             actor_names: List of actor names.
 
         Returns:
-            List of orientation arrays.
+            Array of shape (N, 3), one orientation per row.
         """
         cmd = [f'vget /object/{actor_name}/rotation' for actor_name in actor_names]
-        with self.lock:
-            res = self.client.request_batch(cmd)
-        # Parse each response and convert to numpy array
-        orientations = [np.array([float(i) for i in r.split()]) for r in res]
-        return orientations
+        res = self._request(cmd)
+        # Parse all responses at once into a single contiguous array
+        return _parse_floats(res, (len(res), 3))
+
+    def get_pose_batch(self, actor_names):
+        """Batch get object locations and orientations in one round trip.
+
+        Args:
+            actor_names: List of actor names.
+
+        Returns:
+            Tuple (locations, orientations) of arrays of shape (N, 3), in the order of actor_names.
+        """
+        actor_names = list(actor_names)
+        cmd = [f'vget /object/{actor_name}/location' for actor_name in actor_names]
+        cmd += [f'vget /object/{actor_name}/rotation' for actor_name in actor_names]
+        res = self._request(cmd)
+        # The first half of the responses are locations, the second half rotations
+        poses = _parse_floats(res, (2, len(actor_names), 3))
+        return poses[0], poses[1]
+
+    def get_world_snapshot(self, actor_names):
+        """Get locations and orientations of many objects with a single command.
+
+        Calls the GetSnapshot function of the WorldManager blueprint, which takes
+        the comma separated actor names and returns its output Snapshot as
+        "x y z pitch yaw roll" per actor, in the same order. Falls back to
+        get_pose_batch if the blueprint is not available in the level.
+
+        Args:
+            actor_names: List of actor names.
+
+        Returns:
+            Tuple (locations, orientations) of arrays of shape (N, 3), in the order of actor_names.
+        """
+        actor_names = list(actor_names)
+        if not actor_names:
+            return np.empty((0, 3)), np.empty((0, 3))
+        if not self._snapshot_supported:
+            return self.get_pose_batch(actor_names)
+        cmd = f'vbp WorldManager GetSnapshot {",".join(actor_names)}'
+        res = self._request(cmd)
+        try:
+            snapshot = msgspec.json.decode(res)['Snapshot']
+        except (msgspec.DecodeError, KeyError, TypeError):
+            # UE replies with a plain "error ..." message if the blueprint is missing
+            self._snapshot_supported = False
+            return self.get_pose_batch(actor_names)
+        poses = _parse_floats(snapshot, (len(actor_names), 6))
+        return poses[:, :3], poses[:, 3:]
+
+    def get_pose_array(self, actor_names):
+        """Get poses of many objects as one array, decoded from a binary msgpack reply.
+
+        Args:
+            actor_names: List of actor names.
+
+        Returns:
+            Array of shape (N, 6), each row is [x, y, z, pitch, yaw, roll].
+        """
+        actor_names = list(actor_names)
+        if not actor_names:
+            return np.empty((0, 6))
+        cmd = f'vget /objects/poses {",".join(actor_names)}'
+        res = self._request(cmd)
+        if isinstance(res, str):
+            # Older plugins and unknown objects reply with a text error message
+            locations, orientations = self.get_pose_batch(actor_names)
+            return np.hstack([locations, orientations])
+        return np.asarray(self._pose_decoder.decode(res), dtype=np.float64).reshape(-1, 6)
 
     def show_img(self, img, title='raw_img'):
         """Display an image.
@@ -322,33 +571,180 @@ class UnrealCV(object):
         cv2.imshow(title, img)
         cv2.waitKey(3)
 
-    def read_image(self, cam_id, viewmode, mode='direct'):
+    def read_image(self, cam_id, viewmode, mode='fast', out=None):
         """Read an image.
 
+        The default 'fast' mode transfers raw BMP pixels, which saves the PNG
+        compression in UE and the decompression here. The image has the size of the
+        camera, read from the BMP header. It falls back to PNG when the viewmode has no
+        BMP output. Use 'direct' to always transfer PNG.
+
+        Unlike 'direct', the 'fast' image is a read-only, non-contiguous view of the
+        reply. Pass out, or call copy() on the result, to get a writable array.
+
+        The 'shm' mode only works when UE runs on this machine: UE writes the pixels
+        into a shared memory region of the camera and only a short reply goes through
+        the socket. It falls back to 'fast' if the region or the command is unavailable,
+        or if the viewmode is not a color image, e.g. depth.
+
         Args:
             cam_id: Camera ID, e.g., 0, 1, 2...
             viewmode: View mode, e.g., lit, normal, depth, object_mask.
-            mode: Mode, possible values are 'direct', 'file', 'fast'.
+            mode: Mode, possible values are 'direct', 'file', 'fast', 'shm', defaults to 'fast'.
+            out: Preallocated (h, w, 3) uint8 array to copy the image into in every mode,
+                see decode_bmp. A ValueError is raised if the image has another shape,
+                defaults to None.
 
         Returns:
-            Image data.
+            Image data, out if it is given.
         """
+        if mode == 'shm':  # Get image from unrealcv through shared memory
+            image = self._read_image_shm(cam_id, viewmode, out)
+            if image is not None:
+                return image
+            mode = 'fast'
+
+        if mode == 'fast':  # Get image from unrealcv in bmp format
+            cmd = f'vget /camera/{cam_id}/{viewmode} bmp'
+            res = self._request(cmd)
+            if _bmp_size(res) is not None:
+                return self.decode_bmp(res, out=out)
+            mode = 'direct'
+
         if mode == 'direct':  # Get image from unrealcv in png format
             cmd = f'vget /camera/{cam_id}/{viewmode} png'
-            with self.lock:
-                image = self.decode_png(self.client.request(cmd))
+            res = self._request(cmd)
+            image = self.decode_png(res)
 
         elif mode == 'file':  # Save image to file and read it
             cmd = f'vget /camera/{cam_id}/{viewmode} {viewmode}{self.ip}.png'
-            with self.lock:
-                img_dirs = self.client.request(cmd)
+            img_dirs = self._request(cmd)
             image = cv2.imread(img_dirs)
-        elif mode == 'fast':  # Get image from unrealcv in bmp format
-            cmd = f'vget /camera/{cam_id}/{viewmode} bmp'
-            with self.lock:
-                image = self.decode_bmp(self.client.request(cmd))
+        if out is not None:
+            np.copyto(out, image)
+            return out
         return image
 
+    def read_images(self, cam_ids, viewmode, mode='fast'):
+        """Read images of several cameras with one round trip.
+
+        The UnrealCV server accepts a single client, so instead of one socket per camera
+        the requests are pipelined on the same socket with request_batch. BMP replies are
+        decoded in place as views, PNG replies are decoded in parallel by a thread pool.
+        Cameras without a BMP reply in 'fast' mode are fetched again as PNG in one more
+        batch.
+
+        Args:
+            cam_ids: List of camera IDs.
+            viewmode: View mode, e.g., lit, normal, depth, object_mask.
+            mode: Mode, 'fast' or 'direct' are batched, other modes read the cameras one
+                by one, defaults to 'fast'.
+
+        Returns:
+            List of images, in the order of cam_ids.
+        """
+        cam_ids = list(cam_ids)
+        if mode not in ('fast', 'direct'):
+            return [self.read_image(cam_id, viewmode, mode) for cam_id in cam_ids]
+        images = [None] * len(cam_ids)
+        png_ids = range(len(cam_ids))
+        if mode == 'fast':
+            cmd = [f'vget /camera/{cam_id}/{viewmode} bmp' for cam_id in cam_ids]
+            res = self._request(cmd)
+            for i, r in enumerate(res):
+                if _bmp_size(r) is not None:
+                    images[i] = self.decode_bmp(r)
+            png_ids = [i for i, image in enumerate(images) if image is None]
+        if png_ids:
+            cmd = [f'vget /camera/{cam_ids[i]}/{viewmode} png' for i in png_ids]
+            res = self._request(cmd)
+            futures = [self._pool.submit(self.decode_png, r) for r in res]
+            for i, future in zip(png_ids, futures):
+                images[i] = future.result()
+        return images
+
+    def _read_image_shm(self, cam_id, viewmode, out=None):
+        """Read an image through the shared memory region of a camera.
+
+        Args:
+            cam_id: Camera ID.
+            viewmode: View mode.
+            out: Preallocated (h, w, 3) uint8 array to copy the image into, defaults to None.
+
+        Returns:
+            Image data, None if the camera can not use shared memory for this viewmode.
+        """
+        if (cam_id, viewmode) in self._shm_unsupported:
+            return None
+        self.flush()
+        with self.lock:
+            for _ in range(2):  # Retry once if the camera was resized since the region was created
+                shm = self._get_shm(cam_id)
+                if shm is None:
+                    break
+                cmd = f'vget /camera/{cam_id}/{viewmode} shm:{shm.name}:{shm.size}'
+                res = self.client.request(cmd)
+                if isinstance(res, str) and not res.startswith('error'):
+                    # Reply is "width height", copy before the next request can overwrite the region
+                    [w, h] = [int(i) for i in res.split()]
+                    image = np.ndarray((h, w, 3), dtype=np.uint8, buffer=shm.buf)
+                    if out is None:
+                        return image.copy()
+                    np.copyto(out, image)
+                    return out
+                if not (isinstance(res, str) and 'too small' in res):
+                    break  # Only color images can be written to shared memory, keep the region
+                self._release_shm(cam_id)
+        self._shm_unsupported.add((cam_id, viewmode))
+        return None
+
+    def _get_shm(self, cam_id):
+        """Get the shared memory region of a camera, create it on first use.
+
+        The region is sized from the film size of the camera, which can differ from the
+        window resolution. Must be called with the client lock held.
+
+        Args:
+            cam_id: Camera ID.
+
+        Returns:
+            SharedMemory sized for a BGR image of the camera, None if unavailable.
+        """
+        shm = self._shm.get(cam_id)
+        if shm is not None:
+            return shm
+        res = self.client.request(f'vget /camera/{cam_id}/size')
+        try:
+            [w, h] = [int(i) for i in res.split()]
+        except (AttributeError, ValueError):  # Error reply, e.g. the plugin has no size command
+            return None
+        size = w * h * 3
+        name = f'uecv_{self.port}_{cam_id}'
+        try:
+            try:
+                shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:  # Left over by a previous run on the same port
+                shm = shared_memory.SharedMemory(name=name)
+                if shm.size < size:
+                    shm.close()
+                    shm.unlink()
+                    shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except OSError:
+            return None
+        self._shm[cam_id] = shm
+        return shm
+
+    def _release_shm(self, cam_id):
+        """Close and remove the shared memory region of a camera.
+
+        Args:
+            cam_id: Camera ID.
+        """
+        shm = self._shm.pop(cam_id, None)
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
     def decode_png(self, res):
         """Decode PNG image.
 
@@ -358,22 +754,37 @@ class UnrealCV(object):
         Returns:
             Decoded image data.
         """
-        img = np.asarray(PIL.Image.open(BytesIO(res)))
-        img = img[:, :, :-1]  # Delete alpha channel
-        img = img[:, :, ::-1]  # Transpose channel order
+        # Decodes straight to contiguous BGR, the alpha channel is dropped by IMREAD_COLOR
+        img = cv2.imdecode(np.frombuffer(res, dtype=np.uint8), cv2.IMREAD_COLOR)
         return img
 
-    def decode_bmp(self, res, channel=4):
+    def decode_bmp(self, res, channel=4, out=None):
         """Decode BMP image.
 
+        The image size is read from the BMP header, so it follows the camera size rather
+        than the window resolution. Without out, no pixel is copied and the result is a
+        read-only, non-contiguous view of res. For a fixed resolution stream that needs a
+        contiguous or writable frame, pass the same out array for every frame instead of
+        copying each one.
+
         Args:
             res: BMP image data.
             channel: Number of channels, defaults to 4.
+            out: Preallocated (h, w, channel - 1) uint8 array to copy the image into,
+                defaults to None.
 
         Returns:
-            Decoded image data.
+            Decoded image data, out if it is given, otherwise a read-only view of res.
         """
-        img = np.fromstring(res, dtype=np.uint8)
-        img = img[-self.resolution[1]*self.resolution[0]*channel:]
-        img = img.reshape(self.resolution[1], self.resolution[0], channel)
-        return img[:, :, :-1]  # Delete alpha channel
\ No newline at end of file
+        size = _bmp_size(res)
+        if size is None:
+            raise ValueError(f'Can not decode a BMP image from reply {res[:200]!r}')
+        [w, h] = size
+        # Pixels are at the end of the reply, after the bmp header and the int32 pixel count
+        img = np.frombuffer(res, dtype=np.uint8)[-w * h * channel:]
+        img = img.reshape(h, w, channel)
+        img = img[:, :, :-1]  # Delete alpha channel
+        if out is not None:
+            np.copyto(out, img)
+            return out
+        return img
\ No newline at end of file